@@ -10,13 +10,24 @@ Date: 2025-05-31
 
 # ==== Standard-library imports ====
 import os                      # Path handling & directory walking
-import sys                     # Command-line argument reading
+import sys                     # argv & string interning
+import argparse                # Command-line option parsing
 import re                       # Simple pattern matching inside JS
 import logging                 # Clean terminal output
-
-# ==== Third-party import (HTML parsing) ====
-# Install once with:  pip install beautifulsoup4
-from bs4 import BeautifulSoup  # type: ignore
+import mmap                    # Zero-copy views of large files
+import pickle                  # On-disk cache of per-file results
+import hashlib                 # Cache file name per scanned root
+from contextlib import contextmanager  # Scoped file buffers
+from typing import Iterator, Optional, Union  # Annotations for helpers
+import threading               # Per-thread Hyperscan scratch space
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor  # Parallel parsing
+
+# ==== Optional third-party import (SIMD regex scanning) ====
+# Install with:  pip install hyperscan   (falls back to the stdlib `re` engine)
+try:
+    import hyperscan  # type: ignore
+except ImportError:
+    hyperscan = None
 
 # ------------------------------------------------------------------
 # ------------------------ GLOBAL CONSTANTS ------------------------
@@ -24,37 +35,224 @@ from bs4 import BeautifulSoup  # type: ignore
 
 HTML_EXT   = ".html"   # Extension marking HTML files
 JS_EXT     = ".js"     # Extension marking JavaScript files
+JS_EXT_B   = b".js"    # Same, for matching against raw file bytes
+
+# Vendored / generated directories never worth scanning (override on the CLI)
+IGNORE_DIRS = frozenset({"node_modules", ".git", "dist", "build", ".next", ".cache", "vendor"})
 
 LOG_LEVEL  = logging.INFO         # Default verbosity
 LOG_FMT    = "%(levelname)s: %(message)s"  # Log line style
 
-HTML_TAG   = "script"  # Tag we look for in HTML
-HTML_ATTR  = "src"     # Attribute on <script> tag that holds the path
-
-# Regexes to catch most common import syntaxes inside JS -----------------
+THREAD_WORKERS    = (os.cpu_count() or 1) * 2  # Threads overlapping file reads
+PROCESS_THRESHOLD = 500   # More files than this → processes (sidestep the GIL)
+PROCESS_CHUNKSIZE = 16    # Files handed to a worker process per round-trip
+
+MMAP_THRESHOLD    = 64 * 1024  # Files at least this big are mmap'd, not read()
+
+# Per-file results are cached across runs, keyed by (mtime_ns, size) ---------
+# One cache file per scanned root, holding only the files seen in its last run.
+CACHE_DIR     = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "find_unused_js"
+)
+CACHE_VERSION = 5   # Bump whenever parsing rules change to drop stale entries
+
+ResultCache = dict[str, tuple[int, int, frozenset[str]]]  # path → (mtime_ns, size, names)
+
+# A quoted path whose capture group is ONLY its last segment, so the C-level
+# regex engine does the basename split instead of a Python call per match.
+QUOTED_BASENAME = rb"""["'](?:[^"']*[/\\])?([^"'/\\]+)["']"""
+
+# Regex pulling the src=… basename out of every <script> tag in raw HTML bytes.
+# HTML comments are matched too (no group set) so <script> tags inside them are
+# consumed and skipped; `src` must be a whole attribute name, not `data-src`.
+# Quoted attribute values before it are skipped whole, so a `>` or `src=`
+# inside them neither ends the tag nor counts as the real attribute.
+# Group 1 holds a quoted value's basename, group 2 an unquoted one's.
+SCRIPT_SRC_RE = re.compile(
+    rb"""<!--.*?-->"""
+    rb"""|<script\b(?:"[^"]*"|'[^']*'|[^'">])*?(?<![\w-])src\s*=\s*"""
+    rb"""(?:""" + QUOTED_BASENAME + rb"""|(?:[^\s"'>]*[/\\])?([^\s"'>/\\]+))""",
+    re.IGNORECASE | re.DOTALL,
+)
+
+# Regex catching the most common import syntaxes inside JS --------------
+# All alternatives are fused into ONE pattern so each file is scanned once;
+# exactly one of the capture groups is set per match. Bytes patterns let the
+# scan run on raw file contents, so only the captured basenames get decoded,
+# and keep \w / \s on ASCII-only tables (bytes regexes never use Unicode ones).
 IMPORT_PATTERNS = [
     # ES-module static imports: import abc from './utils.js'
-    re.compile(r"""import\s+(?:[\w*\s{},]*\s+from\s+)?["']([^"']+)["']"""),
+    rb"""import\s+(?:[\w*\s{},]*\s+from\s+)?""" + QUOTED_BASENAME,
     # Dynamic import(): const mod = await import('./chunk')
-    re.compile(r"""import\(\s*["']([^"']+)["']\s*\)"""),
+    rb"""import\(\s*""" + QUOTED_BASENAME + rb"""\s*\)""",
     # CommonJS require(): const lib = require('../lib/core.js')
-    re.compile(r"""require\(\s*["']([^"']+)["']\s*\)"""),
+    rb"""require\(\s*""" + QUOTED_BASENAME + rb"""\s*\)""",
 ]
+COMBINED_IMPORT_RE = re.compile(b"|".join(IMPORT_PATTERNS))
+
+# When Hyperscan is installed, all patterns are compiled into one SIMD DFA that
+# only locates match starts; COMBINED_IMPORT_RE then extracts the path there.
+# Any Hyperscan failure (unsupported CPU, pattern rejected) means the `re` path.
+_HS_LOCAL = threading.local()  # Scratch space may not be shared between threads
+
+IMPORT_HS_DB = None
+if hyperscan is not None:
+    try:
+        _db = hyperscan.Database()
+        _db.compile(
+            expressions=IMPORT_PATTERNS,
+            ids=list(range(len(IMPORT_PATTERNS))),
+            flags=[hyperscan.HS_FLAG_SOM_LEFTMOST] * len(IMPORT_PATTERNS),
+        )
+        _HS_LOCAL.scratch = hyperscan.Scratch(_db)   # Proves scratch allocation works
+        IMPORT_HS_DB = _db
+    except hyperscan.error:
+        pass
 
 # ------------------------------------------------------------------
 # --------------------------- HELPERS ------------------------------
 # ------------------------------------------------------------------
 
-def collect_files(root: str, extension: str) -> list[str]:
+def collect_files(root: str, extensions: tuple[str, ...],
+                  ignore_dirs: frozenset[str] = IGNORE_DIRS) -> tuple[list[os.DirEntry], ...]:
+    """
+    Recursively gather every file ending with one of *extensions*, in a single
+    traversal. Returns one list per extension, in the same order.
+    Entries are kept (not just paths) so their name and cached stat can be
+    reused later. entry.path is *root*-prefixed, so absolute when *root* is.
+    Directories named in *ignore_dirs* are pruned without being opened.
+    Uses an explicit stack over os.scandir so cached DirEntry data avoids extra stats.
+    """
+    buckets: dict[str, list[os.DirEntry]] = {ext.lower(): [] for ext in extensions}
+    stack = [root]                    # entry.path is root + sep + name: no join/abspath
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:               # Unreadable / vanished directory
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir():
+                    # Like os.walk: symlinked dirs are never files, nor followed
+                    if not entry.is_symlink() and entry.name not in ignore_dirs:
+                        stack.append(entry.path)
+                    continue
+                name = entry.name
+                suffix = name[name.rfind("."):]   # Short tail only – no full-name copy
+                bucket = buckets.get(suffix)
+                if bucket is None:                # Rare upper/mixed case: ".JS", ".Html"
+                    bucket = buckets.get(suffix.lower())
+                if bucket is not None:
+                    bucket.append(entry)
+    return tuple(buckets[ext.lower()] for ext in extensions)
+
+
+@contextmanager
+def open_source(path: str) -> Iterator[Union[bytes, mmap.mmap]]:
+    """
+    Yield a file's contents as a bytes-like buffer the regexes can scan.
+    Small files: open, fstat, one read, close – no buffered-IO layer on top.
+    Large files: a read-only mmap, so matching runs straight on the page cache
+    without copying the whole file into a bytes object first.
+    Concurrency comes from the worker pool keeping many of these in flight.
+    """
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        size = os.fstat(fd).st_size
+        if size < MMAP_THRESHOLD:
+            yield os.read(fd, size)
+        else:
+            with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+                yield mm
+    finally:
+        os.close(fd)
+
+
+def cache_file(root: str) -> str:
+    """
+    Path of the cache file belonging to the absolute scan root *root*.
+    """
+    digest = hashlib.sha1(os.fsencode(root)).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, digest + ".pkl")
+
+
+def load_cache(root: str) -> ResultCache:
+    """
+    Load the path → (mtime_ns, size, names) cache of *root*; any problem means
+    an empty cache.
+    """
+    try:
+        with open(cache_file(root), "rb") as fp:
+            version, entries = pickle.load(fp)
+    except Exception:          # Missing, corrupt or foreign file – start afresh
+        return {}
+    return entries if version == CACHE_VERSION else {}
+
+
+def save_cache(root: str, cache: ResultCache) -> None:
     """
-    Recursively gather **absolute paths** of every file whose name ends with *extension*.
+    Atomically write the cache of *root* to disk; failure only costs speed next run.
     """
-    files: list[str] = []
-    for current_dir, _, filenames in os.walk(root):
-        for fname in filenames:
-            if fname.lower().endswith(extension):
-                files.append(os.path.abspath(os.path.join(current_dir, fname)))
-    return files
+    path = cache_file(root)
+    tmp_path = path + ".tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(tmp_path, "wb") as fp:
+            pickle.dump((CACHE_VERSION, cache), fp, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as exc:
+        logging.warning("Could not write cache %s: %s", path, exc)
+
+
+def parse_in_parallel(parse_one, files: list[str]) -> list[set[str]]:
+    """
+    Run *parse_one* on every file in parallel, returning results in input order.
+    Small batches use threads (cheap to start, overlap disk I/O); large batches
+    use processes so regex work escapes the GIL.
+    """
+    if not files:
+        return []
+
+    if len(files) > PROCESS_THRESHOLD:
+        with ProcessPoolExecutor() as executor:
+            return list(executor.map(parse_one, files, chunksize=PROCESS_CHUNKSIZE))
+
+    with ThreadPoolExecutor(max_workers=THREAD_WORKERS) as executor:
+        return list(executor.map(parse_one, files))
+
+
+def union_over_files(parse_one, entries: list[os.DirEntry],
+                     cache: Optional[ResultCache]) -> set[str]:
+    """
+    Union of *parse_one* over all files. Files whose (mtime_ns, size) match the
+    cache are not re-read; everything else is parsed and written into *cache*.
+    Sizes and mtimes come from DirEntry.stat(), which caches its result (and on
+    Windows is filled in by the directory listing itself, costing no syscall).
+    With *cache* None, every file is parsed and nothing is stat'd.
+    """
+    if cache is None:
+        return set().union(*parse_in_parallel(parse_one, [e.path for e in entries]))
+
+    per_file: list[frozenset[str]] = []   # Unioned once at the end, not per file
+    stale: list[str] = []
+    stale_keys: list[tuple[int, int]] = []
+
+    for entry in entries:
+        path = entry.path
+        st = entry.stat()
+        key = (st.st_mtime_ns, st.st_size)
+        hit = cache.get(path)
+        if hit is not None and hit[:2] == key:
+            per_file.append(hit[2])
+        else:
+            stale.append(path)
+            stale_keys.append(key)
+
+    for path, key, names in zip(stale, stale_keys, parse_in_parallel(parse_one, stale)):
+        frozen = frozenset(names)
+        cache[path] = (*key, frozen)
+        per_file.append(frozen)
+    return set().union(*per_file)
 
 
 # ------------- HTML → JS -----------------------------------------
@@ -64,89 +262,150 @@ def js_names_in_html(html_path: str) -> set[str]:
     Return basenames of every .js file referenced by <script src="…"> tags
     in a single HTML file.
     """
-    names: set[str] = set()
-
-    with open(html_path, "r", encoding="utf-8", errors="ignore") as fp:
-        soup = BeautifulSoup(fp.read(), "html.parser")
-
-    for tag in soup.find_all(HTML_TAG, src=True):
-        basename = os.path.basename(tag.get(HTML_ATTR, ""))
-        if basename.lower().endswith(JS_EXT):
-            names.add(basename)
-    return names
+    with open_source(html_path) as data:
+        return {
+            sys.intern(m[m.lastindex].decode("utf-8", "ignore"))
+            for m in SCRIPT_SRC_RE.finditer(data)   # Streamed – no list of all matches
+            if m.lastindex and m[m.lastindex].lower().endswith(JS_EXT_B)
+        }
 
 
-def all_js_names_from_html(html_files: list[str]) -> set[str]:
+def all_js_names_from_html(html_files: list[os.DirEntry],
+                           cache: Optional[ResultCache]) -> set[str]:
     """
     Union of every JS basename referenced by all HTML files.
     """
-    union: set[str] = set()
-    for html in html_files:
-        union.update(js_names_in_html(html))
-    return union
+    return union_over_files(js_names_in_html, html_files, cache)
 
 
 # ------------- JS → JS -------------------------------------------
 
+def import_specifiers(content: Union[bytes, mmap.mmap]) -> Iterator[bytes]:
+    """
+    Yield the raw basename of every import / import() / require() in *content*.
+    """
+    if IMPORT_HS_DB is None:
+        for m in COMBINED_IMPORT_RE.finditer(content):
+            yield m.group(m.lastindex)
+        return
+
+    scratch = getattr(_HS_LOCAL, "scratch", None)
+    if scratch is None:
+        scratch = _HS_LOCAL.scratch = hyperscan.Scratch(IMPORT_HS_DB)
+
+    starts: set[int] = set()
+    IMPORT_HS_DB.scan(
+        content,
+        match_event_handler=lambda _id, start, _end, _flags, _ctx: starts.add(start),
+        scratch=scratch,
+    )
+    # Hyperscan reports overlapping matches too; skip starts inside an accepted
+    # match so results are exactly what finditer (the fallback) would return.
+    last_end = 0
+    for start in sorted(starts):
+        if start < last_end:
+            continue
+        m = COMBINED_IMPORT_RE.match(content, start)
+        if m:
+            last_end = m.end()
+            yield m.group(m.lastindex)
+
+
 def js_names_in_js(js_path: str) -> set[str]:
     """
     Scan one JS file, returning basenames of any imported / required JS.
     """
     names: set[str] = set()
 
-    with open(js_path, "r", encoding="utf-8", errors="ignore") as fp:
-        content = fp.read()
-
-    for pattern in IMPORT_PATTERNS:
-        for match in pattern.findall(content):
-            base = os.path.basename(match)
+    with open_source(js_path) as content:
+        for match in import_specifiers(content):
+            base = match.decode("utf-8", "ignore")
 
             # If no extension supplied (e.g. `import './helper'`), assume .js
             if not os.path.splitext(base)[1]:
                 base += JS_EXT
 
             if base.lower().endswith(JS_EXT):
-                names.add(base)
+                names.add(sys.intern(base))   # Same few names recur across files
     return names
 
 
-def all_js_names_from_js(js_files: list[str]) -> set[str]:
+def all_js_names_from_js(js_files: list[os.DirEntry],
+                         cache: Optional[ResultCache]) -> set[str]:
     """
     Union of every JS basename imported or required by all JS files.
     """
-    union: set[str] = set()
-    for js in js_files:
-        union.update(js_names_in_js(js))
-    return union
+    return union_over_files(js_names_in_js, js_files, cache)
 
 
 # ------------- MAIN WORK -----------------------------------------
 
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    """
+    Command line: an optional folder to scan, directory-exclusion tweaks and
+    a switch to bypass the on-disk cache.
+    """
+    parser = argparse.ArgumentParser(
+        description="List JavaScript files referenced nowhere in a directory tree."
+    )
+    parser.add_argument("directory", nargs="?", default=".",
+                        help="folder to scan (default: current directory)")
+    parser.add_argument("--exclude", action="append", default=[], metavar="NAME",
+                        help="directory name to skip, on top of the defaults (repeatable)")
+    parser.add_argument("--no-default-excludes", action="store_true",
+                        help="also scan %s" % ", ".join(sorted(IGNORE_DIRS)))
+    parser.add_argument("--no-cache", action="store_true",
+                        help="parse every file; neither read nor write the cache in %s" % CACHE_DIR)
+    return parser.parse_args(argv)
+
+
 def main() -> None:
     """
-    * Get the folder to scan (default '.') from CLI.
-    * Collect all HTML and JS files.
-    * Figure out every JS basename referenced from HTML and JS.
+    * Get the folder to scan (default '.'), exclusions and cache switch from CLI.
+    * Collect all HTML and JS files, skipping vendored directories.
+    * Figure out every JS basename referenced from HTML and JS
+      (re-using cached results for files unchanged since the last run,
+      and skipping the JS pass if HTML already references every JS file).
     * Log only those JS paths that are referenced **nowhere**.
     """
-    target_dir = os.path.abspath(sys.argv[1] if len(sys.argv) > 1 else ".")
+    args = parse_args(sys.argv[1:])
+    target_dir = os.path.abspath(args.directory)   # Resolved once; every path inherits it
+    ignore_dirs = frozenset(args.exclude)
+    if not args.no_default_excludes:
+        ignore_dirs |= IGNORE_DIRS
     logging.basicConfig(level=LOG_LEVEL, format=LOG_FMT)
     logging.info("Scanning directory: %s", target_dir)
 
-    html_files = collect_files(target_dir, HTML_EXT)
-    js_files   = collect_files(target_dir, JS_EXT)
+    html_files, js_files = collect_files(target_dir, (HTML_EXT, JS_EXT), ignore_dirs)
     logging.info("Found %d HTML files and %d JS files.", len(html_files), len(js_files))
 
-    # ----- Gather all referenced JS basenames -----
-    referenced_from_html = all_js_names_from_html(html_files)
-    referenced_from_js   = all_js_names_from_js(js_files)
+    # ----- Gather all referenced JS basenames (unchanged files come from cache) -----
+    # A pass is skipped once nothing is left that it could still prove used.
+    candidates = {sys.intern(entry.name) for entry in js_files}
+
+    cache: Optional[ResultCache] = None
+    if not args.no_cache:
+        # Keep only files still present, so deleted ones drop out of the cache
+        stored = load_cache(target_dir)
+        seen = {entry.path for entry in html_files} | {entry.path for entry in js_files}
+        cache = {path: hit for path, hit in stored.items() if path in seen}
+
+    referenced: set[str] = set()
+    if candidates:
+        referenced |= all_js_names_from_html(html_files, cache)
+    if candidates - referenced:
+        referenced |= all_js_names_from_js(js_files, cache)
+
+    if cache is not None and cache != stored:   # Nothing changed → no rewrite
+        save_cache(target_dir, cache)
 
-    referenced_anywhere  = referenced_from_html | referenced_from_js  # Union
+    # Interned + frozen: lookups below hit the identity fast path in str equality
+    referenced_anywhere = frozenset(map(sys.intern, referenced))
 
     # ----- Determine unused JS paths -----
     unused_js_paths: list[str] = [
-        path for path in js_files
-        if os.path.basename(path) not in referenced_anywhere
+        entry.path for entry in js_files
+        if entry.name not in referenced_anywhere
     ]
 
     # ----- Log result -----